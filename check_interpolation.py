@@ -0,0 +1,68 @@
+"""Check the adaptive redshift sampling in 21cm_analysis.py against exact values
+
+Runs refine_trajectories on an analytic stand-in for the mean brightness
+temperature (an absorption trough plus a late emission bump, shifted and
+scaled by h, Ωm and Ω_b like the real signal) and compares the interpolated
+trajectories and the relative-difference panel with the stand-in evaluated
+on every redshift. No T_b simulation is run.
+"""
+import os
+import runpy
+
+import numpy as np
+
+analysis = runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                       '21cm_analysis.py'))
+z = analysis['z']
+std_params = analysis['std_params']
+
+# Trough widths in redshift to check, from broad to narrow
+TROUGH_WIDTHS = [3.5, 2.5, 1.5]
+
+def stand_in(redshift, hubble, matter, baryon, width):
+    """21cm-like mean brightness temperature in mK"""
+    depth = 150 * (baryon / 0.02) * (hubble / 0.69)**2 * (0.31 / matter)**0.5
+    center = 17 + 40 * (matter - 0.31) + 100 * (baryon - 0.02)
+    width = width * 0.69 / hubble
+    return (-depth * np.exp(-0.5 * ((redshift - center) / width)**2)
+            + 25 * (baryon / 0.02) * np.exp(-0.5 * ((redshift - 10) / 2)**2)
+            - 10 * np.exp(-0.5 * ((redshift - 30) / 6)**2))
+
+def main():
+    std = (std_params['hubble'], std_params['matter'], std_params['baryon'])
+    param_sets = [std]
+    param_sets += [(h, std[1], std[2]) for h in analysis['hubble_variations'] if h != std[0]]
+    param_sets += [(std[0], m, std[2]) for m in analysis['matter_variations'] if m != std[1]]
+    param_sets += [(std[0], std[1], b) for b in analysis['baryon_variations'] if b != std[2]]
+
+    for width in TROUGH_WIDTHS:
+        calls = 0
+
+        def evaluate(tasks):
+            nonlocal calls
+            calls += len(tasks)
+            return {task: stand_in(*task, width) for task in tasks}
+
+        sim_idx, trajectories = analysis['refine_trajectories'](param_sets, evaluate)
+        exact = {params: stand_in(z, *params, width) for params in param_sets}
+
+        # Interpolated T_b, relative to each trajectory's peak |T_b|
+        Tb_error = max(np.abs(trajectories[p] - exact[p]).max() / np.abs(exact[p]).max()
+                       for p in param_sets)
+
+        # Relative differences as ax5 plots them, at the simulated redshifts
+        pct_error = 0.0
+        for p in param_sets[1:]:
+            pct_exact = (exact[p] - exact[std]) / exact[std] * 100
+            pct = (trajectories[p] - trajectories[std]) / trajectories[std] * 100
+            scale = np.abs(pct_exact).max()
+            pct_error = max(pct_error, np.abs(pct - pct_exact)[sim_idx].max() / scale)
+
+        print(f"Trough width {width}: {calls}/{len(param_sets) * len(z)} simulations, "
+              f"{len(sim_idx)}/{len(z)} redshifts")
+        print(f"  T_b max error: {100 * Tb_error:.2f}% of peak |T_b|")
+        print(f"  ax5 max error: {100 * pct_error:.2f}% of peak |ΔT_b/T_b|")
+
+
+if __name__ == "__main__":
+    main()